@@ -8,6 +8,7 @@ import re
 import logging
 import threading
 import json
+import queue
 
 import homeassistant.core as ha
 from homeassistant.helpers.state import TrackStates
@@ -18,7 +19,7 @@ from homeassistant.const import (
     URL_API_CONFIG, URL_API_BOOTSTRAP,
     EVENT_TIME_CHANGED, EVENT_HOMEASSISTANT_STOP, MATCH_ALL,
     HTTP_OK, HTTP_CREATED, HTTP_BAD_REQUEST, HTTP_NOT_FOUND,
-    HTTP_UNPROCESSABLE_ENTITY)
+    HTTP_UNPROCESSABLE_ENTITY, ATTR_ENTITY_ID)
 
 
 DOMAIN = 'api'
@@ -27,6 +28,9 @@ DEPENDENCIES = ['http']
 STREAM_PING_PAYLOAD = "ping"
 STREAM_PING_INTERVAL = 50  # seconds
 
+# Max number of events queued per stream client before it is disconnected
+STREAM_QUEUE_SIZE = 100
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -96,56 +100,181 @@ def _handle_get_api(handler, path_match, data):
 
 
 def _handle_get_api_stream(handler, path_match, data):
-    """ Provide a streaming interface for the event bus. """
-    gracefully_closed = False
-    hass = handler.server.hass
-    wfile = handler.wfile
-    write_lock = threading.Lock()
-    block = threading.Event()
-
-    def write_message(payload):
-        """ Writes a message to the output. """
-        with write_lock:
-            msg = "data: {}\n\n".format(payload)
-
-            try:
-                wfile.write(msg.encode("UTF-8"))
-                wfile.flush()
-            except IOError:
-                block.set()
-
-    def forward_events(event):
-        """ Forwards events to the open request. """
-        nonlocal gracefully_closed
+    """ Provide a streaming interface for the event bus.
 
-        if block.is_set() or event.event_type == EVENT_TIME_CHANGED:
-            return
-        elif event.event_type == EVENT_HOMEASSISTANT_STOP:
-            gracefully_closed = True
-            block.set()
-            return
+    Optional parameters restrict and entity_id take a comma separated list of
+    event types and entity ids to filter the stream on.
+    """
+    if handler.server.event_stream is None:
+        handler.server.event_stream = EventStream(handler.server.hass)
 
-        write_message(json.dumps(event, cls=rem.JSONEncoder))
+    client = handler.server.event_stream.connect(
+        _split_param(data.get('restrict')),
+        _split_param(data.get('entity_id')))
 
     handler.send_response(HTTP_OK)
     handler.send_header('Content-type', 'text/event-stream')
     handler.end_headers()
 
-    hass.bus.listen(MATCH_ALL, forward_events)
+    payload = STREAM_PING_PAYLOAD
 
-    while True:
-        write_message(STREAM_PING_PAYLOAD)
+    while payload is not None:
+        msg = "data: {}\n\n".format(payload)
 
-        block.wait(STREAM_PING_INTERVAL)
-
-        if block.is_set():
+        try:
+            handler.wfile.write(msg.encode("UTF-8"))
+            handler.wfile.flush()
+        except IOError:
             break
 
-    if not gracefully_closed:
+        payload = client.get(STREAM_PING_INTERVAL)
+
+    if not client.gracefully_closed:
         _LOGGER.info("Found broken event stream to %s, cleaning up",
                      handler.client_address[0])
 
-    hass.bus.remove_listener(MATCH_ALL, forward_events)
+    handler.server.event_stream.disconnect(client)
+
+
+def _split_param(value):
+    """ Splits a comma separated query parameter into a set. """
+    if not value:
+        return None
+
+    return set(part.strip() for part in value.split(',') if part.strip())
+
+
+class EventStream(object):
+    """
+    Listens once on the event bus and fans out the events to all connected
+    stream clients. Each event is serialized at most once.
+    """
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def connect(self, event_types=None, entity_ids=None):
+        """ Returns a new client that will receive the stream. """
+        client = EventStreamClient(event_types, entity_ids)
+
+        with self._lock:
+            if not self._clients:
+                self.hass.bus.listen(MATCH_ALL, self._event_listener)
+
+            self._clients.append(client)
+
+        return client
+
+    def disconnect(self, client):
+        """ Stops sending events to client. """
+        client.close()
+
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+            if not self._clients:
+                self.hass.bus.remove_listener(
+                    MATCH_ALL, self._event_listener)
+
+    def _event_listener(self, event):
+        """ Serializes the event and queues it for interested clients. """
+        if event.event_type == EVENT_TIME_CHANGED:
+            return
+
+        with self._lock:
+            clients = list(self._clients)
+
+        if event.event_type == EVENT_HOMEASSISTANT_STOP:
+            for client in clients:
+                client.close(gracefully=True)
+            return
+
+        payload = None
+
+        for client in clients:
+            if not client.matches(event):
+                continue
+
+            if payload is None:
+                payload = json.dumps(event, cls=rem.JSONEncoder)
+
+            if not client.put(payload):
+                _LOGGER.warning(
+                    "Event stream client is not keeping up, disconnecting")
+                self.disconnect(client)
+
+
+class EventStreamClient(object):
+    """ Bounded queue of serialized events for one stream connection. """
+
+    def __init__(self, event_types=None, entity_ids=None):
+        self.event_types = event_types
+        self.entity_ids = entity_ids
+        self.gracefully_closed = False
+        self._queue = queue.Queue(STREAM_QUEUE_SIZE)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def matches(self, event):
+        """ Returns True if event passes the filters of this client. """
+        if self.event_types and event.event_type not in self.event_types:
+            return False
+
+        if self.entity_ids:
+            entity_ids = event.data.get(ATTR_ENTITY_ID)
+
+            if isinstance(entity_ids, str):
+                return entity_ids in self.entity_ids
+
+            if not isinstance(entity_ids, (list, tuple)):
+                return False
+
+            return not self.entity_ids.isdisjoint(entity_ids)
+
+        return True
+
+    def put(self, payload):
+        """ Queues a payload. Returns False if the queue is full. """
+        with self._lock:
+            if self._closed:
+                return True
+
+            try:
+                self._queue.put_nowait(payload)
+                return True
+            except queue.Full:
+                return False
+
+    def get(self, timeout):
+        """
+        Blocks till a payload is available. Returns the ping payload if none
+        became available within timeout and None if the client is closed.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None if self._closed else STREAM_PING_PAYLOAD
+
+    def close(self, gracefully=False):
+        """ Closes the client and wakes up the connection thread. """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            self.gracefully_closed = gracefully
+
+            # Drop pending payloads to make room for the close marker
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            self._queue.put_nowait(None)
 
 
 def _handle_get_api_config(handler, path_match, data):
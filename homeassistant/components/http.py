@@ -182,6 +182,7 @@ class HomeAssistantHTTPServer(ThreadingMixIn, HTTPServer):
 
         # We will lazy init this one if needed
         self.event_forwarder = None
+        self.event_stream = None
 
         if development:
             _LOGGER.info("running http in development mode")
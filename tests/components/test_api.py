@@ -15,7 +15,7 @@ import homeassistant.core as ha
 import homeassistant.bootstrap as bootstrap
 import homeassistant.remote as remote
 import homeassistant.components.http as http
-from homeassistant.const import HTTP_HEADER_HA_AUTH
+from homeassistant.const import HTTP_HEADER_HA_AUTH, URL_API_STREAM
 
 API_PASSWORD = "test1234"
 
@@ -367,3 +367,28 @@ class TestAPI(unittest.TestCase):
                 }),
             headers=HA_HEADERS)
         self.assertEqual(200, req.status_code)
+
+    def test_api_stream_filters(self):
+        """ Test the event stream only sends events matching the filters. """
+        req = requests.get(
+            _url(URL_API_STREAM),
+            params={'restrict': 'test_stream_a,test_stream_b',
+                    'entity_id': 'light.kitchen'},
+            headers=HA_HEADERS, stream=True, timeout=5)
+
+        lines = req.iter_lines(chunk_size=1, decode_unicode=True)
+
+        # First message is always a ping
+        self.assertEqual('data: ping', next(lines))
+
+        hass.bus.fire('test_stream_a', {'entity_id': 'light.living_room'})
+        hass.bus.fire('test_stream_c', {'entity_id': 'light.kitchen'})
+        hass.bus.fire('test_stream_b', {'entity_id': ['light.kitchen']})
+
+        data = json.loads(
+            next(line for line in lines if line)[len('data: '):])
+
+        self.assertEqual('test_stream_b', data['event_type'])
+        self.assertEqual(['light.kitchen'], data['data']['entity_id'])
+
+        req.close()